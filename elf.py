@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 
 import argparse
-import demjson3
-import io
+import array
+import collections.abc
+import concurrent.futures
+import copy
+import itertools
 import json
+import mmap
 import os
 import struct
 
@@ -419,32 +423,49 @@ Elf64_Shdr = [
   ("sh_entsize",   ("Elf64_Xword", 1))   # Entry size if section holds table 
 ]
 
+def _reserve(buf, size):
+	# Zero-extend a bytearray to at least size bytes, the way writing past the
+	# end of a BytesIO does.
+	if size > len(buf):
+		buf.extend(bytes(size - len(buf)))
+
+def _writeAt(buf, offset, data):
+	_reserve(buf, offset + len(data))
+	buf[offset:offset + len(data)] = data
+
 class BinaryMarshaller:
+	# (scheme, compiled struct.Struct, field layout), keyed by (id(scheme), endian).
+	# Holding on to the scheme keeps its id from being reused by another list.
+	_structs = {}
+	# Compiled struct.Struct objects for scalar reads, keyed by (typeName, count, endian).
+	_scalars = {}
+
 	# Map well-known type names into struct format characters.
+	typeNames = {
+		'int8'         :'b',
+		'uint8'        :'B',
+		'int16'        :'h',
+		'uint16'       :'H',
+		'int32'        :'i',
+		'uint32'       :'I',
+		'int64'        :'q',
+		'uint64'       :'Q',
+		'float'        :'f',
+		'double'       :'d',
+		'char'         :'s',
+		'Elf32_Half'   :'H',
+		'Elf32_Word'   :'I',
+		'Elf32_Off'    :'I',
+		'Elf32_Addr'   :'I',
+		'Elf64_Half'   :'H',
+		'Elf64_Word'   :'I',
+		'Elf64_Off'    :'Q',
+		'Elf64_Addr'   :'Q',
+		'Elf64_Xword'  :'Q'
+	}
+	schemes = ["Elf_Ident", "Elf32_Ehdr", "Elf64_Ehdr"]
+
 	def __init__(self, file):
-		self.typeNames = {
-			'int8'         :'b',
-			'uint8'        :'B',
-			'int16'        :'h',
-			'uint16'       :'H',
-			'int32'        :'i',
-			'uint32'       :'I',
-			'int64'        :'q',
-			'uint64'       :'Q',
-			'float'        :'f',
-			'double'       :'d',
-			'char'         :'s',
-			'Elf32_Half'   :'H',
-			'Elf32_Word'   :'I',
-			'Elf32_Off'    :'I',
-			'Elf32_Addr'   :'I',
-			'Elf64_Half'   :'H',
-			'Elf64_Word'   :'I',
-			'Elf64_Off'    :'Q',
-			'Elf64_Addr'   :'Q',
-			'Elf64_Xword'  :'Q'
-		}
-		self.schemes = ["Elf_Ident", "Elf32_Ehdr", "Elf64_Ehdr"]
 		self.file = file
 		
 	def __enter__(self):
@@ -459,36 +480,32 @@ class BinaryMarshaller:
 	def tell(self):
 		return self.file.tell()	
 	
+	def compileScalar(self, typeName, count = 1, endian = ELFDATA2LSB):
+		key = (typeName, count, endian)
+		compiled = self._scalars.get(key)
+		if compiled is None:
+			prefix = "<" if endian == ELFDATA2LSB else ">"
+			compiled = struct.Struct(f"{prefix}{count}{self.typeNames[typeName]}")
+			self._scalars[key] = compiled
+
+		return compiled
+
 	def read(self, typeName, count = 1, endian = ELFDATA2LSB):
 		if typeName in self.schemes:
 			return self.readStruct(globals()[typeName], endian)
 
-		if endian == ELFDATA2LSB:
-			endian = "<"
-		else:
-			endian = ">"
-
-		typeFormat = self.typeNames[typeName]
-		typeSize = count * struct.calcsize(typeFormat)
-		value = self.file.read(typeSize)
-		if typeSize != len(value):
+		s = self.compileScalar(typeName, count, endian)
+		value = self.file.read(s.size)
+		if s.size != len(value):
 			raise RuntimeError("Not enough bytes in file to satisfy read request")
-		return struct.unpack(f"{endian}{count}{typeFormat}", value)[0]
+		return s.unpack_from(value)[0]
 
 	def write(self, obj, typeName, count, endian = ELFDATA2LSB):
 		if typeName in self.schemes:
 			self.writeStruct(obj, globals()[typeName], endian)
 			return
 
-		if endian == ELFDATA2LSB:
-			endian = "<"
-		else:
-			endian = ">"
-
-		typeFormat = self.typeNames[typeName]
-		typeSize = count * struct.calcsize(typeFormat)
-		obj_packed = struct.pack(f"{endian}{count}{typeFormat}", obj)	
-		self.file.write(obj_packed)
+		self.file.write(self.compileScalar(typeName, count, endian).pack(obj))
 		
 	def readBytes(self, numBytes):
 		return self.file.read(numBytes)
@@ -497,88 +514,433 @@ class BinaryMarshaller:
 		return self.file.write(obj)
 		
 	def readCString(self, iLen = 1):
-		res = []
+		start = self.file.tell()
+		if isinstance(self.file, mmap.mmap):
+			# A single C-level scan of the mapping for the terminator.
+			end = self.file.find(b"\x00", start)
+			if end < 0:
+				raise RuntimeError("Unterminated string in file")
+			res = self.file[start:end]
+			self.file.seek(end + 1)
+			return res
+
+		# Otherwise look for the terminator a chunk at a time instead of byte by byte.
+		chunks = []
 		while True:
-			c = self.file.read(1)
-			if c == "\x00":
-				return "".join(res)
-			res.append(c)
+			chunk = self.file.read(64)
+			if not chunk:
+				raise RuntimeError("Unterminated string in file")
+			end = chunk.find(b"\x00")
+			if end >= 0:
+				chunks.append(chunk[:end])
+				res = b"".join(chunks)
+				self.file.seek(start + len(res) + 1)
+				return res
+			chunks.append(chunk)
+
+	@classmethod
+	def schemeFormat(cls, scheme):
+		# Flatten a scheme (including nested schemes) into a single format string.
+		fmt = ""
+		fields = []
+		for name, (typename, count) in scheme:
+			if typename in cls.schemes:
+				subFmt, subFields = cls.schemeFormat(globals()[typename])
+				fmt += subFmt
+				fields.append((name, subFields))
+				continue
+
+			typeFormat = cls.typeNames[typename]
+			if typeFormat == "s":
+				# char[N] (even N == 1) is a single "Ns" item that decodes to one
+				# bytes value, so every field maps to exactly one unpacked value.
+				fmt += f"{count}s"
+			elif count == 1:
+				fmt += typeFormat
+			else:
+				raise RuntimeError(f"Unsupported array {name}: {typename}[{count}]")
+			fields.append((name, None))
 
-	def readStruct(self, scheme, endian = ELFDATA2LSB):
+		return fmt, tuple(fields)
+
+	@classmethod
+	def compileStruct(cls, scheme, endian = ELFDATA2LSB):
+		key = (id(scheme), endian)
+		cached = cls._structs.get(key)
+		if cached is None:
+			fmt, fields = cls.schemeFormat(scheme)
+			prefix = "<" if endian == ELFDATA2LSB else ">"
+			cached = cls._structs[key] = (scheme, struct.Struct(prefix + fmt), fields)
+
+		return cached[1:]
+
+	def _unflatten(self, fields, values):
 		res = dict()
-		for name, (typename, count) in scheme:
-			res[name] = self.read(typename, count, endian)
+		for name, subFields in fields:
+			if subFields is None:
+				res[name] = next(values)
+			else:
+				res[name] = self._unflatten(subFields, values)
 
 		return res
 
+	@classmethod
+	def _flatten(cls, fields, obj, values):
+		for name, subFields in fields:
+			if subFields is None:
+				values.append(obj[name])
+			else:
+				cls._flatten(subFields, obj[name], values)
+
+		return values
+
+	def readStruct(self, scheme, endian = ELFDATA2LSB):
+		s, fields = self.compileStruct(scheme, endian)
+		buf = self.file.read(s.size)
+		if s.size != len(buf):
+			raise RuntimeError("Not enough bytes in file to satisfy read request")
+
+		return self._unflatten(fields, iter(s.unpack_from(buf)))
+
 	def writeStruct(self, struct, scheme, endian = ELFDATA2LSB):
-		for name, (typename, count) in scheme:
-			self.write(struct[name], typename, count, endian)
+		s, fields = self.compileStruct(scheme, endian)
+		self.file.write(s.pack(*self._flatten(fields, struct, [])))
+
+	@classmethod
+	def writeStructAt(cls, struct, scheme, endian, buf, offset):
+		# Encode a struct in place into a writable buffer, without going through a file.
+		s, fields = cls.compileStruct(scheme, endian)
+		_reserve(buf, offset + s.size)
+		s.pack_into(buf, offset, *cls._flatten(fields, struct, []))
+		return offset + s.size
+
+	@classmethod
+	def writeStructArrayAt(cls, table, scheme, endian, buf, offset, count):
+		# Encode the first count entries of a table with one pack call.
+		if count > len(table):
+			raise IndexError("header table index out of range")
+		s, fields = cls.compileStruct(scheme, endian)
+		columns = [table.column(name) for name, _ in fields]
+		packed = struct.Struct(s.format[0] + s.format[1:] * count)
+		_reserve(buf, offset + packed.size)
+		packed.pack_into(buf, offset, *itertools.chain.from_iterable(itertools.islice(zip(*columns), count)))
+		return offset + packed.size
 
 	def __exit__(self, exc_type, exc_value, traceback):
-		if exc_type is not None:
-			raise
-		return self
+		return False
+
+def _precompile():
+	# Compile every ELF scheme for both data encodings up front, so parsing
+	# only ever hits the cache.
+	for scheme in (Elf_Ident, Elf32_Ehdr, Elf64_Ehdr, Elf32_Phdr, Elf64_Phdr, Elf32_Shdr, Elf64_Shdr):
+		for endian in (ELFDATA2LSB, ELFDATA2MSB):
+			BinaryMarshaller.compileStruct(scheme, endian)
+
+_precompile()
+
+_MISSING = object()
+
+class HeaderRow(collections.abc.MutableMapping):
+	# Dict-like view of a single HeaderTable entry.
+	__slots__ = ("table", "index")
+
+	def __init__(self, table, index):
+		self.table = table
+		self.index = index
+
+	def __getitem__(self, key):
+		value = self.table.columns[key][self.index]
+		if value is _MISSING:
+			raise KeyError(key)
+		return value
+
+	def __setitem__(self, key, value):
+		self.table._column(key, value)[self.index] = value
+
+	def __delitem__(self, key):
+		if key not in self:
+			raise KeyError(key)
+		self.table._column(key, _MISSING)[self.index] = _MISSING
+
+	def __contains__(self, key):
+		column = self.table.columns.get(key)
+		return column is not None and column[self.index] is not _MISSING
+
+	def __iter__(self):
+		for key in list(self.table.columns):
+			if key in self:
+				yield key
+
+	def __len__(self):
+		return sum(1 for key in self)
+
+	def __repr__(self):
+		return repr(dict(self))
+
+class HeaderTable(collections.abc.MutableSequence):
+	# Homogeneous header table (phdrs/shdrs) stored column-wise: one typed
+	# array per field instead of one dict per entry. Rows are views by
+	# position, so a row fetched before an insert or delete refers to
+	# whichever entry ends up at its index.
+	def __init__(self, columns, flat):
+		k = len(columns)
+		self._len = len(flat) // k
+		self.columns = dict()
+		for i, (name, typeFormat) in enumerate(columns):
+			if typeFormat == "s":
+				self.columns[name] = list(flat[i::k])
+			else:
+				self.columns[name] = array.array(typeFormat, flat[i::k])
+
+	def __len__(self):
+		return self._len
+
+	def _index(self, index):
+		if index < 0:
+			index += self._len
+		if not 0 <= index < self._len:
+			raise IndexError("header table index out of range")
+		return index
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [HeaderRow(self, i) for i in range(*index.indices(self._len))]
+		return HeaderRow(self, self._index(index))
+
+	def __setitem__(self, index, entry):
+		# Replace a whole entry; keys the entry lacks become missing in that row.
+		index = self._index(index)
+		entry = dict(entry)
+		for name in list(self.columns):
+			value = entry.pop(name, _MISSING)
+			self._column(name, value)[index] = value
+		for name, value in entry.items():
+			self._column(name, value)[index] = value
+
+	def __delitem__(self, index):
+		index = self._index(index)
+		for column in self.columns.values():
+			del column[index]
+		self._len -= 1
+
+	def insert(self, index, entry):
+		index = min(max(index + self._len if index < 0 else index, 0), self._len)
+		entry = dict(entry)
+		for name in list(self.columns):
+			value = entry.pop(name, _MISSING)
+			self._column(name, value).insert(index, value)
+		self._len += 1
+		for name, value in entry.items():
+			self._column(name, value)[index] = value
+
+	def pop(self, index = -1):
+		# Rows are positional views, so hand back a copy of the removed entry.
+		entry = dict(self[index])
+		del self[index]
+		return entry
+
+	def reverse(self):
+		for column in self.columns.values():
+			column.reverse()
+
+	def _column(self, name, value):
+		# Column for name that is able to store value.
+		column = self.columns.get(name)
+		if column is None:
+			column = self.columns[name] = [_MISSING] * self._len
+		elif value is _MISSING and not isinstance(column, list):
+			# Typed arrays cannot hold the _MISSING marker.
+			column = self.columns[name] = list(column)
+		return column
+
+	def __iter__(self):
+		for index in range(self._len):
+			yield HeaderRow(self, index)
+
+	def column(self, name):
+		return self.columns[name]
+
+# Header parsers generated by _make_parser(), keyed by (EI_CLASS, EI_DATA).
+_parsers = {}
+
+_PARSER_TEMPLATE = """
+def parse(mv):
+	if len(mv) < {ehdrSize}:
+		raise RuntimeError("Not enough bytes in file to satisfy read request")
+	{values}, = unpackEhdr(mv, 0)
+	ehdr = {ehdr}
+
+	phdrTable = Struct({prefix!r} + {phdrFormat!r} * {e_phnum})
+	if {e_phoff} + phdrTable.size > len(mv):
+		raise RuntimeError("Not enough bytes in file to satisfy read request")
+	phdrs = HeaderTable(phdrColumns, phdrTable.unpack_from(mv, {e_phoff}))
+
+	shdrTable = Struct({prefix!r} + {shdrFormat!r} * {e_shnum})
+	if {e_shoff} + shdrTable.size > len(mv):
+		raise RuntimeError("Not enough bytes in file to satisfy read request")
+	shdrs = HeaderTable(shdrColumns, shdrTable.unpack_from(mv, {e_shoff}))
+
+	return ehdr, phdrs, shdrs
+"""
+
+def _make_parser(elfClass, endian):
+	# Generate a straight-line Ehdr/Phdr/Shdr parser for one (EI_CLASS, EI_DATA)
+	# pair, with the struct layouts and dict keys baked into the code.
+	parse = _parsers.get((elfClass, endian))
+	if parse is not None:
+		return parse
+
+	if elfClass == ELFCLASS32:
+		Elf_Ehdr, Elf_Phdr, Elf_Shdr = Elf32_Ehdr, Elf32_Phdr, Elf32_Shdr
+	elif elfClass == ELFCLASS64:
+		Elf_Ehdr, Elf_Phdr, Elf_Shdr = Elf64_Ehdr, Elf64_Phdr, Elf64_Shdr
+	else:
+		raise RuntimeError(f"Unknown EI_CLASS = {elfClass}")
+
+	ehdr, ehdrFields = BinaryMarshaller.compileStruct(Elf_Ehdr, endian)
+	phdr, _ = BinaryMarshaller.compileStruct(Elf_Phdr, endian)
+	shdr, _ = BinaryMarshaller.compileStruct(Elf_Shdr, endian)
+
+	# Every Ehdr field becomes a local v<N>; nested schemes become nested dict literals.
+	variables = dict()
+	def literal(fields):
+		items = []
+		for name, subFields in fields:
+			if subFields is None:
+				variables[name] = f"v{len(variables)}"
+				items.append(f"{name!r}: {variables[name]}")
+			else:
+				items.append(f"{name!r}: {literal(subFields)}")
+		return "{" + ", ".join(items) + "}"
+
+	ehdrLiteral = literal(ehdrFields)
+	source = _PARSER_TEMPLATE.format(
+		ehdrSize = ehdr.size,
+		values = ", ".join(variables.values()),
+		ehdr = ehdrLiteral,
+		prefix = ehdr.format[0],
+		phdrFormat = phdr.format[1:],
+		shdrFormat = shdr.format[1:],
+		e_phoff = variables["e_phoff"],
+		e_phnum = variables["e_phnum"],
+		e_shoff = variables["e_shoff"],
+		e_shnum = variables["e_shnum"],
+	)
+	namespace = {
+		"Struct": struct.Struct,
+		"HeaderTable": HeaderTable,
+		"unpackEhdr": ehdr.unpack_from,
+		"phdrColumns": [(name, BinaryMarshaller.typeNames[typename]) for name, (typename, _) in Elf_Phdr],
+		"shdrColumns": [(name, BinaryMarshaller.typeNames[typename]) for name, (typename, _) in Elf_Shdr],
+	}
+	exec(compile(source, f"<elf parser {elfClass}/{endian}>", "exec"), namespace)
+	parse = _parsers[(elfClass, endian)] = namespace["parse"]
+	return parse
 
 class ELF:
 	def __init__(self, input_file):
-		self.file = io.BytesIO(open(input_file, "rb").read())
+		with open(input_file, "rb") as f:
+			self._mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+		self.file = self._mm
+
+		self._mv = memoryview(self._mm)
 		self._parse()
 
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+		return False
+
+	def __del__(self):
+		self.close()
+
+	def close(self):
+		# Segment and section contents are read lazily from the mapping, so
+		# phdrs/shdrs must have been accessed before closing to stay usable;
+		# afterwards they raise ValueError instead.
+		mv = getattr(self, "_mv", None)
+		if mv is not None:
+			mv.release()
+		mm = getattr(self, "_mm", None)
+		if mm is not None and not mm.closed:
+			mm.close()
+
 	def _parse(self):
-		with BinaryMarshaller(self.file) as bm:
-			self.e_ident = bm.readStruct(Elf_Ident, endian = ELFDATA2MSB)
-			assert(self.e_ident["ELF_MAG"] == ELFMAG)
-			assert(self.e_ident["EI_VERSION"] == EV_CURRENT)
-			endian = self.e_ident["EI_DATA"]
-
-			bm.seek(0)
-			if self.e_ident["EI_CLASS"] == ELFCLASS32:
-				Elf_Phdr = Elf32_Phdr
-				Elf_Shdr = Elf32_Shdr
-				self.ehdr = bm.readStruct(Elf32_Ehdr, endian = endian)
-			elif self.e_ident["EI_CLASS"] == ELFCLASS64:
-				Elf_Phdr = Elf64_Phdr
-				Elf_Shdr = Elf64_Shdr
-				self.ehdr = bm.readStruct(Elf64_Ehdr, endian = endian)
-			else:
-				raise RuntimeError(f"Unknown EI_CLASS = {e_ident['EI_CLASS']}")
-
-			bm.seek(self.ehdr["e_phoff"])
-
-			self.phdrs = []
-			self.shdrs = []
-			self.loadable_segments = []
-
-			for _ in range(self.ehdr["e_phnum"]):
-				elf_phdr = bm.readStruct(Elf_Phdr, endian = endian)
-				self.phdrs.append(elf_phdr)
-				if elf_phdr["p_type"] == PT_LOAD:
-					cursor = bm.tell()
-					new_cursor = elf_phdr["p_offset"]
-					segment_size = elf_phdr["p_filesz"]
-					if new_cursor == 0:
-						new_cursor += self.ehdr["e_ehsize"]
-						segment_size -= self.ehdr["e_ehsize"]
-					bm.seek(new_cursor)
-					segment = bm.readBytes(segment_size)
-					bm.seek(cursor)
-					elf_phdr["contents"] = [segment, new_cursor, segment_size]
-					self.loadable_segments.append([new_cursor, segment_size])
-
-			bm.seek(self.ehdr["e_shoff"])
-			for _ in range(self.ehdr["e_shnum"]):
-				elf_shdr = bm.readStruct(Elf_Shdr, endian = endian)
-				self.shdrs.append(elf_shdr)
-				cursor = bm.tell()
-				new_cursor = elf_shdr["sh_offset"]
-				section_size = elf_shdr["sh_size"]
-				elf_shdr["overlap"] = self.checkSectionOverlap(new_cursor, section_size)
-				if not elf_shdr["overlap"]:
-					bm.seek(new_cursor)
-					section = bm.readBytes(section_size)
-					elf_shdr["contents"] = [section, new_cursor, section_size]
-					bm.seek(cursor)
+		# Reject non-ELF input before doing any other work; unlike assert this
+		# also runs under python -O.
+		magic = self._mm[:SELFMAG]
+		if magic != ELFMAG:
+			raise ValueError(f"Not an ELF: {magic!r}")
+
+		mv = self._mv
+		if len(mv) < EI_NIDENT:
+			raise RuntimeError("Not enough bytes in file to satisfy read request")
+
+		# e_ident is the first member of the Ehdr, so peek the class and
+		# data encoding and decode all headers with a parser specialised
+		# for them.
+		parse = _make_parser(mv[EI_CLASS], mv[EI_DATA])
+		self.ehdr, self._phdrs, self._shdrs = parse(mv)
+		self.e_ident = self.ehdr["e_ident"]
+		if self.e_ident["EI_VERSION"] != EV_CURRENT:
+			raise ValueError(f"Unknown EI_VERSION = {self.e_ident['EI_VERSION']}")
+
+		# Contents are only copied out of the file once phdrs/shdrs are
+		# handed out; until then serialize() copies straight from the mapping
+		# as long as the ehdr still describes the parsed layout.
+		self._parsedEhdr = copy.deepcopy(self.ehdr)
+		self._contentsLoaded = False
+		self.loadable_segments = [[new_cursor, segment_size] for _, new_cursor, segment_size in self._segments()]
+
+	def _segments(self):
+		for phdr in self._phdrs:
+			if phdr["p_type"] == PT_LOAD:
+				new_cursor = phdr["p_offset"]
+				segment_size = phdr["p_filesz"]
+				if new_cursor == 0:
+					new_cursor += self._parsedEhdr["e_ehsize"]
+					segment_size -= self._parsedEhdr["e_ehsize"]
+				yield phdr, new_cursor, segment_size
+
+	def _sections(self):
+		for shdr in self._shdrs:
+			new_cursor = shdr["sh_offset"]
+			section_size = shdr["sh_size"]
+			yield shdr, new_cursor, section_size, self.checkSectionOverlap(new_cursor, section_size)
+
+	def _checkOpen(self):
+		if self._mm.closed:
+			raise ValueError("Segment and section contents are not loaded and the ELF file is closed")
+
+	def _loadContents(self):
+		if self._contentsLoaded:
+			return
+
+		self._checkOpen()
+		mv = self._mv
+		for phdr, new_cursor, segment_size in self._segments():
+			segment = mv[new_cursor:new_cursor + segment_size].tobytes()
+			phdr["contents"] = [segment, new_cursor, segment_size]
+
+		for shdr, new_cursor, section_size, overlap in self._sections():
+			shdr["overlap"] = overlap
+			if not overlap:
+				section = mv[new_cursor:new_cursor + section_size].tobytes()
+				shdr["contents"] = [section, new_cursor, section_size]
+
+		self._contentsLoaded = True
+
+	@property
+	def phdrs(self):
+		self._loadContents()
+		return self._phdrs
+
+	@property
+	def shdrs(self):
+		self._loadContents()
+		return self._shdrs
 
 	def checkSectionOverlap(self, section_start, section_size):
 		for seg_start, seg_size in self.loadable_segments:
@@ -613,89 +975,168 @@ class ELF:
 
 	def getFileSize(self):
 		if self.ehdr["e_shoff"] > 0:
-			return self.ehdr["e_shoff"] + len(self.shdrs) * self.ehdr["e_shentsize"]
+			return self.ehdr["e_shoff"] + len(self._shdrs) * self.ehdr["e_shentsize"]
 		else:
 			res = 0
-			for phdr in self.phdrs:
+			for phdr in self._phdrs:
 				if phdr["p_type"] == PT_LOAD:
 					res += phdr["p_filesz"]
 			return res
 
 	def serialize(self):
-		buf = io.BytesIO(b"\x00" * self.getFileSize())
-		with BinaryMarshaller(buf) as bm:
-			if self.e_ident["EI_CLASS"] == ELFCLASS32:
-				Elf_Ehdr = Elf32_Ehdr
-				Elf_Phdr = Elf32_Phdr
-				Elf_Shdr = Elf32_Shdr
-			elif self.e_ident["EI_CLASS"] == ELFCLASS64:
-				Elf_Ehdr = Elf64_Ehdr
-				Elf_Phdr = Elf64_Phdr
-				Elf_Shdr = Elf64_Shdr
-			else:
-				raise RuntimeError(f"Unknown EI_CLASS = {e_ident['EI_CLASS']}")
-
-			endian = self.e_ident["EI_DATA"]
-
-			bm.writeStruct(self.ehdr, Elf_Ehdr)
-			bm.seek(self.ehdr["e_phoff"])
-
-			for i in range(self.ehdr["e_phnum"]):
-				bm.writeStruct(self.phdrs[i], Elf_Phdr, endian = endian)
-				if self.phdrs[i]["p_type"] == PT_LOAD:
-					prev_cursor = bm.tell()
-					segment, new_cursor, seg_size = self.phdrs[i]["contents"]
-					bm.seek(new_cursor)
-					bm.writeBytes(segment)
-					bm.seek(prev_cursor)
-
-			bm.seek(self.ehdr["e_shoff"])
-			for i in range(self.ehdr["e_shnum"]):
-				bm.writeStruct(self.shdrs[i], Elf_Shdr, endian = endian)
-				if self.shdrs[i]["overlap"]:
+		buf = bytearray(self.getFileSize())
+		if self.e_ident["EI_CLASS"] == ELFCLASS32:
+			Elf_Ehdr = Elf32_Ehdr
+			Elf_Phdr = Elf32_Phdr
+			Elf_Shdr = Elf32_Shdr
+		elif self.e_ident["EI_CLASS"] == ELFCLASS64:
+			Elf_Ehdr = Elf64_Ehdr
+			Elf_Phdr = Elf64_Phdr
+			Elf_Shdr = Elf64_Shdr
+		else:
+			raise RuntimeError(f"Unknown EI_CLASS = {self.e_ident['EI_CLASS']}")
+
+		endian = self.e_ident["EI_DATA"]
+
+		if not self._contentsLoaded and self.ehdr == self._parsedEhdr:
+			# The header tables were never handed out and the ehdr still
+			# points at them, so copy them and the contents they describe
+			# straight from the mapping without decoding anything further.
+			self._copyThrough(buf, Elf_Phdr, Elf_Shdr, endian)
+		else:
+			self._loadContents()
+			e_phnum = self.ehdr["e_phnum"]
+			e_shnum = self.ehdr["e_shnum"]
+			# Contents go in first and the header tables last, so header edits
+			# win over the original bytes of a segment that covers them.
+			for phdr in self._phdrs[:e_phnum]:
+				if phdr["p_type"] == PT_LOAD:
+					segment, new_cursor, seg_size = phdr["contents"]
+					_writeAt(buf, new_cursor, segment)
+
+			for shdr in self._shdrs[:e_shnum]:
+				if shdr["overlap"]:
 					continue
-				prev_cursor = bm.tell()
-				section, new_cursor, section_size = self.shdrs[i]["contents"]
-				bm.seek(new_cursor)
-				bm.writeBytes(section)
-				bm.seek(prev_cursor)
+				section, new_cursor, section_size = shdr["contents"]
+				_writeAt(buf, new_cursor, section)
 
-			res = self.deserialize()
+			BinaryMarshaller.writeStructArrayAt(self._phdrs, Elf_Phdr, endian, buf, self.ehdr["e_phoff"], e_phnum)
+			BinaryMarshaller.writeStructArrayAt(self._shdrs, Elf_Shdr, endian, buf, self.ehdr["e_shoff"], e_shnum)
 
-			self.debug(res)
+		BinaryMarshaller.writeStructAt(self.ehdr, Elf_Ehdr, endian, buf, 0)
 
-			self.file = io.BytesIO(bm.file.getbuffer().tobytes())
+		if args["debug"]:
+			self.deserialize()
+
+		return buf
+
+	def _copyThrough(self, buf, Elf_Phdr, Elf_Shdr, endian):
+		self._checkOpen()
+		mv = self._mv
+		phoff = self._parsedEhdr["e_phoff"]
+		phsize = len(self._phdrs) * BinaryMarshaller.compileStruct(Elf_Phdr, endian)[0].size
+		_writeAt(buf, phoff, mv[phoff:phoff + phsize])
+		for _, new_cursor, segment_size in self._segments():
+			_writeAt(buf, new_cursor, mv[new_cursor:new_cursor + segment_size])
+
+		shoff = self._parsedEhdr["e_shoff"]
+		shsize = len(self._shdrs) * BinaryMarshaller.compileStruct(Elf_Shdr, endian)[0].size
+		_writeAt(buf, shoff, mv[shoff:shoff + shsize])
+		for _, new_cursor, section_size, overlap in self._sections():
+			if not overlap:
+				_writeAt(buf, new_cursor, mv[new_cursor:new_cursor + section_size])
 
 	def read(self):
-		self.serialize()
-		return self.file.getbuffer().tobytes()
+		return bytes(self.serialize())
 
 def ALIGN(num, alignment):
 	return (num//alignment + (1 if num/alignment > num//alignment else 0))*alignment
 
+def _jsonDefault(obj):
+	# Bytes become latin-1 strings, one character per byte, so that
+	# obj.encode("latin-1") restores them. The old demjson3 output stored them
+	# as integer arrays and sorted the keys; see "JSON output" in README.md.
+	if isinstance(obj, (bytes, bytearray)):
+		return obj.decode("latin-1")
+	# deserialize() hands out the live header tables.
+	if isinstance(obj, HeaderTable):
+		return list(obj)
+	if isinstance(obj, HeaderRow):
+		return dict(obj)
+	return repr(obj)
+
 def main(input_file, output_file, out_json = False, silent = False, debug = False):
-	elf = ELF(input_file)
-
-	print(f"ELF file size: {elf.getFileSize()}")
-	if out_json:
-		if not output_file:
-			basename = os.path.basename(input_file)
-			output_file = f"{basename}.json"
-		deserialized_elf = elf.deserialize()
-		elf_json = json.dumps(json.loads(demjson3.encode(deserialized_elf)), indent = 4)
-		open(output_file, "wb").write(elf_json.encode("latin-1"))
-	else:
-		if not output_file:
-			basename = os.path.basename(input_file)
-			output_file = f"{basename}_modified"
-		open(output_file, "wb").write(elf.read())
+	with ELF(input_file) as elf:
+		print(f"ELF file size: {elf.getFileSize()}")
+		if out_json:
+			if not output_file:
+				basename = os.path.basename(input_file)
+				output_file = f"{basename}.json"
+			deserialized_elf = elf.deserialize()
+			elf_json = json.dumps(deserialized_elf, indent = 4, default = _jsonDefault)
+			open(output_file, "wb").write(elf_json.encode("latin-1"))
+		else:
+			if not output_file:
+				basename = os.path.basename(input_file)
+				output_file = f"{basename}_modified"
+			open(output_file, "wb").write(elf.read())
+
+# Overridden by the command line; workers started with spawn/forkserver only
+# ever see this default.
+args = {"debug": False}
+
+def _output_path(input_file, output_dir, out_json):
+	# Same naming as main(): outputs are named after the input's basename.
+	suffix = ".json" if out_json else "_modified"
+	return os.path.join(output_dir or "", os.path.basename(input_file) + suffix)
+
+def _output_collision(files, output_dir, out_json):
+	# Inputs sharing a basename (e.g. d1/x and d2/x) would silently overwrite
+	# each other's output.
+	seen = dict()
+	for input_file in files:
+		output_file = _output_path(input_file, output_dir, out_json)
+		key = os.path.normcase(os.path.abspath(output_file))
+		if key in seen:
+			return f"{seen[key]} and {input_file} would both be written to {output_file}"
+		seen[key] = input_file
+
+	return None
+
+def _process_one(job):
+	input_file, output_file, out_json, silent, debug = job
+	# Workers started with spawn/forkserver do not inherit the parsed command line.
+	args["debug"] = debug
+	main(input_file, output_file, out_json = out_json, silent = silent, debug = debug)
+	return output_file
+
+def main_batch(files, output_dir, out_json = False, workers = None, silent = False, debug = False):
+	collision = _output_collision(files, output_dir, out_json)
+	if collision:
+		raise ValueError(collision)
+
+	jobs = [(input_file, _output_path(input_file, output_dir, out_json), out_json, silent, debug) for input_file in files]
+	# Each worker maps its own input file, so only the file names cross processes.
+	with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+		return list(executor.map(_process_one, jobs))
 
 if __name__ == "__main__":
 	parser = argparse.ArgumentParser(description = "Parse an ELF file")
-	parser.add_argument("-f", "--file", help = "input file", required = True)
+	parser.add_argument("-f", "--file", help = "input file(s)", required = True, nargs = "+")
 	parser.add_argument("-j", "--json", help = "dump to JSON", action = argparse.BooleanOptionalAction)
 	parser.add_argument("-d", "--debug", help = "verbose debugging", action = argparse.BooleanOptionalAction)
 	parser.add_argument("-s", "--silent", help = "silent mode", action = argparse.BooleanOptionalAction)
 	parser.add_argument("-o", "--output", help = "output file", nargs = '?', type = str)
+	parser.add_argument("-O", "--output-dir", help = "output directory when processing several files", type = str)
+	parser.add_argument("-J", "--jobs", help = "number of worker processes for several files", type = int)
 	args = vars(parser.parse_args())
-	main(args["file"], args["output"], out_json = args["json"], silent = args["silent"], debug = args["debug"])
\ No newline at end of file
+	if args["output"] and (len(args["file"]) > 1 or args["output_dir"]):
+		parser.error("-o/--output takes a single input file; use -O/--output-dir for several")
+	if len(args["file"]) > 1 or args["output_dir"]:
+		collision = _output_collision(args["file"], args["output_dir"], args["json"])
+		if collision:
+			parser.error(collision)
+	if len(args["file"]) == 1 and not args["output_dir"]:
+		main(args["file"][0], args["output"], out_json = args["json"], silent = args["silent"], debug = args["debug"])
+	else:
+		main_batch(args["file"], args["output_dir"], out_json = args["json"], workers = args["jobs"], silent = args["silent"], debug = args["debug"])